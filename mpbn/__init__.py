@@ -25,14 +25,25 @@ True
 [{'a': 0, 'b': 1, 'c': 1}]
 """
 
+from collections import Counter
+import functools
+import hashlib
+import operator
 import os
 import sys
+import tempfile
 from colomoto import minibn
 
 from boolean import boolean
 import clingo
 sys.setrecursionlimit(max(100000, sys.getrecursionlimit()))
 
+# Queries spend almost all their time grounding and solving in clingo.
+# The Python side only prepares the inputs, which are cached per network
+# until it is modified (ASP fragments, fact symbols, grounded controls),
+# and decodes the shown atoms of each model, in batch. Counting queries
+# do not decode models at all.
+
 __asplibdir__ = os.path.realpath(os.path.join(os.path.dirname(__file__), "asplib"))
 
 clingo_options = ["-W", "no-atom-undefined"]
@@ -42,6 +53,20 @@ if hasattr(clingo, "version") and clingo.version() >= (5,5,0):
 def aspf(basename):
     return os.path.join(__asplibdir__, basename)
 
+_ASP_EVAL_CIRCUIT = aspf("eval_circuit.asp")
+_ASP_EVAL_MIXED = aspf("eval_mixed.asp")
+_ASP_MP_EVAL = aspf("mp_eval.asp")
+_ASP_MP_ATTRACTOR = aspf("mp_attractor.asp")
+_ASP_MP_POSITIVEREACH = aspf("mp_positivereach-np.asp")
+
+def _read_asp(path):
+    with open(path, "r") as fp:
+        return fp.read()
+
+# the ASP library is read once, and added to controls as text
+_ASP_SRC = {f: _read_asp(f) for f in [_ASP_EVAL_CIRCUIT, _ASP_EVAL_MIXED,
+            _ASP_MP_EVAL, _ASP_MP_ATTRACTOR, _ASP_MP_POSITIVEREACH]}
+
 def _clingo_domrec(mod, limit=0, project=False, extra_opts=[]):
     s = clingo.Control(clingo_options + extra_opts)
     s.configuration.solve.models = limit
@@ -50,6 +75,8 @@ def _clingo_domrec(mod, limit=0, project=False, extra_opts=[]):
     s.configuration.solve.enum_mode = "domRec"
     s.configuration.solver[0].heuristic = "Domain"
     s.configuration.solver[0].dom_mod = f"{mod},{16 if project else 0}"
+    # restarts slow down the enumeration of many solutions with domRec
+    s.configuration.solver[0].restarts = "no"
     return s
 
 def clingo_subsets(**opts):
@@ -57,65 +84,85 @@ def clingo_subsets(**opts):
 def clingo_supsets(**opts):
     return _clingo_domrec(3, **opts)
 
-def clingo_exists():
-    s = clingo.Control(clingo_options)
+def _clingo_options(multishot=False):
+    if multishot:
+        return [o for o in clingo_options if o != "--single-shot"]
+    return clingo_options
+
+def clingo_exists(multishot=False):
+    s = clingo.Control(_clingo_options(multishot))
     s.configuration.solve.models = 1
     return s
 
-def clingo_enum(project=True, limit=0):
-    s = clingo.Control(clingo_options)
+def clingo_enum(project=True, limit=0, multishot=False):
+    s = clingo.Control(_clingo_options(multishot))
     if project:
         s.configuration.solve.project = 1
     s.configuration.solve.models = limit
     return s
 
+def _count_models(s):
+    """
+    Solves ``s`` and returns the number of enumerated models, read from the
+    solver statistics rather than by iterating over the models.
+    """
+    s.solve()
+    return int(s.statistics["summary"]["models"]["enumerated"])
+
+_symbol_arguments = operator.attrgetter("arguments")
+_symbol_of_sign = {1: clingo.Number(1), -1: clingo.Number(-1)}
+_symbol_of_state = (_symbol_of_sign[-1], _symbol_of_sign[1])
+
 def s2v(s):
     return 1 if s > 0 else -1
 def v2s(v):
     return 1 if v > 0 else 0
 
 def is_dnf_unate(ba, f):
-    pos_lits = set()
-    neg_lits = set()
-    def is_lit(f):
-        if isinstance(f, ba.Symbol):
-            pos_lits.add(f.obj)
-            return True
-        if isinstance(f, ba.NOT) \
-                and isinstance(f.args[0], ba.Symbol):
-            neg_lits.add(f.args[0].obj)
-            return True
-        return False
-
-    def is_clause(f):
-        if is_lit(f):
-            return True
-        if isinstance(f, ba.AND):
-            for g in f.args:
-                if not is_lit(g):
-                    return False
-            return True
-        return False
-
-    def test_monotonicity():
-        both = pos_lits.intersection(neg_lits)
-        return not both
-
+    Symbol = ba.Symbol
+    NOT = ba.NOT
+    # fast paths for single literals
+    if isinstance(f, Symbol):
+        return True
+    if isinstance(f, NOT):
+        return isinstance(f.args[0], Symbol)
     if f in [ba.TRUE, ba.FALSE]:
         return True
-    if is_clause(f):
-        return test_monotonicity()
-    if isinstance(f, ba.OR):
-        for g in f.args:
-            if not is_clause(g):
+
+    # sign bits of each variable: 1 for positive, 2 for negative literals;
+    # stops as soon as a variable occurs with both signs
+    signs = {}
+    for c in (f.args if isinstance(f, ba.OR) else (f,)):
+        for l in (c.args if isinstance(c, ba.AND) else (c,)):
+            if isinstance(l, Symbol):
+                v = l.obj
+                sign = signs.get(v, 0) | 1
+            elif isinstance(l, NOT) and isinstance(l.args[0], Symbol):
+                v = l.args[0].obj
+                sign = signs.get(v, 0) | 2
+            else:
+                return False
+            if sign == 3:
                 return False
-        return test_monotonicity()
-    return False
+            signs[v] = sign
+    return True
 
 def circuitasp_of_boolfunc(f, i, ba):
     atoms = []
     fid = clingo.String(i)
-    def encode(expr):
+    nodetypes = {ba.NOT: "neg", ba.AND: "and", ba.OR: "or"}
+    def nodetype_of_subclass(expr):
+        for cls, nodetype in nodetypes.items():
+            if isinstance(expr, cls):
+                return nodetype
+        raise NotImplementedError(type(expr))
+    # iterative post-order walk; shared subexpressions are encoded once
+    nodeids = {}
+    stack = [(f, False)]
+    while stack:
+        expr, expanded = stack.pop()
+        if id(expr) in nodeids:
+            continue
         if expr == ba.TRUE:
             nodeid = "(constant,1)"
             atoms.append(f"circuit({nodeid}).")
@@ -125,25 +172,35 @@ def circuitasp_of_boolfunc(f, i, ba):
         elif isinstance(expr, ba.Symbol):
             nodeid = f"(var,{clingo.String(expr.obj)})"
             atoms.append(f"circuit({fid},{nodeid}).")
+        elif not expanded:
+            stack.append((expr, True))
+            stack.extend((child, False) for child in reversed(expr.args))
+            continue
         else:
             nodeid = f"n{id(expr)}"
-            if isinstance(expr, ba.NOT):
-                nodetype = "neg"
-            elif isinstance(expr, ba.AND):
-                nodetype = "and"
-            elif isinstance(expr, ba.OR):
-                nodetype = "or"
-            else:
-                raise NotImplementedError(type(expr))
+            nodetype = nodetypes.get(type(expr))
+            if nodetype is None:
+                nodetype = nodetype_of_subclass(expr)
             atoms.append(f"circuit({fid},{nodeid},{nodetype}).")
             for child in expr.args:
-                cid = encode(child)
-                atoms.append(f"circuitedge({fid},{nodeid},{cid}).")
-        return nodeid
-    root = encode(f)
-    atoms.append(f"circuit({fid},root,{root}).\n")
+                atoms.append(f"circuitedge({fid},{nodeid},{nodeids[id(child)]}).")
+        nodeids[id(expr)] = nodeid
+    atoms.append(f"circuit({fid},root,{nodeids[id(f)]}).\n")
     return "\n".join(atoms)
 
+def dnf_clauses(f):
+    """
+    Returns the clauses of the DNF ``f`` as sorted lists of ``(node, sign)``
+    literals, without duplicates nor clauses subsumed by another one.
+    """
+    clauses = set()
+    for c in (f.args if isinstance(f, boolean.OR) else (f,)):
+        clauses.add(frozenset((l.args[0].obj, -1) if isinstance(l, boolean.NOT)
+                        else (l.obj, 1)
+                    for l in (c.args if isinstance(c, boolean.AND) else (c,))))
+    return sorted(sorted(c) for c in clauses
+                    if not any(d < c for d in clauses))
+
 DEFAULT_ENCODING = "mixed-dnf-bdd"
 DEFAULT_BOOLFUNCLIB = os.environ.get("MPBN_BOOLFUNCLIB", "aeon")
 SUPPORTED_BOOLFUNCLIBS = ["aeon", "pyeda"]
@@ -176,7 +233,10 @@ class MPBooleanNetwork(minibn.BooleanNetwork):
         :type bn: :py:class:`colomoto.minibn.BooleanNetwork` or any type accepted by
             :py:class:`colomoto.minibn.BooleanNetwork` constructor
         :param bool auto_dnf: if ``False``, turns off automatic DNF
-            transformation of local functions
+            transformation of local functions. Functions given in unate DNF
+            are stored as written (possibly with redundant clauses), and are
+            only normalized by the DNF transformation when ``simplify`` or
+            ``try_unate_hard`` is set.
         :param str boolfunlib: library to use for Boolean function manipulation
             among ``"aeon"`` (default) or ``"pyeda"``. Default can be overriden with
             ``MPBN_BOOLFUNCLIB`` environment variable.
@@ -195,6 +255,12 @@ class MPBooleanNetwork(minibn.BooleanNetwork):
         self.try_unate_hard = try_unate_hard
         self._simplify = simplify
         self._is_unate = dict()
+        self._dnf_clauses = dict()
+        self._dnf_memo = dict()
+        self._node_asp = dict()
+        self._invalidate()
+        self._name_symbols = dict()
+        self._state_atoms = dict()
 
         self._boolfunclib = boolfunclib
         __boolfunclib_symbols = (
@@ -203,6 +269,8 @@ class MPBooleanNetwork(minibn.BooleanNetwork):
             )
         self._bf_impl = __import__(f"mpbn.boolfunclib.{boolfunclib}_impl",
                                            fromlist=__boolfunclib_symbols)
+        self._make_dnf_boolfunc = self._bf_impl.make_dnf_boolfunc
+        self._bddasp_of_boolfunc = self._bf_impl.bddasp_of_boolfunc
 
         super(MPBooleanNetwork, self).__init__(bn)
 
@@ -210,105 +278,366 @@ class MPBooleanNetwork(minibn.BooleanNetwork):
         """
         Assigns the Boolean function ``f`` to component ``a``.
         Unless :py:attr:`.auto_dnf` is ``False``, ``f`` is converted into DNF
-        form first.
+        form first. Functions which are already in unate DNF are kept as is,
+        unless simplifications have been requested: their text, as returned by
+        ``dict(bn)`` or exported to BoolNet, then follows the input formatting
+        and may contain redundant clauses. Redundant clauses are ignored by the
+        ASP encodings.
         """
         if isinstance(f, str):
             f = self.ba.parse(f)
         f = self._autobool(f)
+        is_unate = None
         if self.auto_dnf:
-            f = self._bf_impl.make_dnf_boolfunc(self.ba, f,
+            if self._simplify or self.try_unate_hard \
+                    or not is_dnf_unate(self.ba, f):
+                # components sharing a same function share its DNF; the
+                # conversion options can be changed after construction
+                key = (str(f), self._simplify, self.try_unate_hard)
+                dnf = self._dnf_memo.get(key)
+                if dnf is None:
+                    dnf = self._dnf_memo[key] = self._make_dnf_boolfunc(self.ba, f,
                                 simplify=self._simplify,
                                 try_unate_hard=self.try_unate_hard)
+                f = dnf
+            else:
+                is_unate = True
+        # constants are stored as the algebra's own TRUE and FALSE, which the
+        # encoders test by identity
+        if f == self.ba.TRUE:
+            f = self.ba.TRUE
+        elif f == self.ba.FALSE:
+            f = self.ba.FALSE
         a = self._autokey(a)
         if self.encoding in self.dnf_encodings:
-            self._is_unate[a] = is_dnf_unate(self.ba, f)
+            if is_unate is None:
+                is_unate = is_dnf_unate(self.ba, f)
+            self._is_unate[a] = is_unate
             if self.encoding == "unate-dnf":
                 assert self._is_unate[a], f"'{f}' seems not unate. Try simplify()?"
+        self._invalidate(a)
         return super().__setitem__(a, f)
 
-    def asp_of_bn(self, encoding=None):
-        if encoding is None:
-            encoding = self.encoding
-
-        def clauses_of_dnf(f):
-            if isinstance(f, boolean.OR):
-                return f.args
+    def _invalidate(self, a=None):
+        """
+        Drops the data derived from the function of component ``a`` (if
+        given), and the caches of queries on the network.
+        Must be called by every method modifying the network.
+        """
+        if a is not None:
+            self._dnf_clauses.pop(a, None)
+            self._node_asp.pop(a, None)
+        self._asp_cache = dict()
+        self._ctl_cache = dict()
+        self._reach_cache = dict()
+        self._bn_digest = None
+
+    def __copy__(self):
+        bn = self.__class__.__new__(self.__class__)
+        dict.update(bn, self)
+        bn.__dict__.update(self.__dict__)
+        bn._is_unate = self._is_unate.copy()
+        bn._dnf_clauses = self._dnf_clauses.copy()
+        bn._node_asp = {n: frags.copy() for (n, frags) in self._node_asp.items()}
+        bn._dnf_memo = self._dnf_memo.copy()
+        # query caches are not shared with the copy
+        bn._invalidate()
+        bn._name_symbols = dict()
+        bn._state_atoms = dict()
+        return bn
+
+    def __delitem__(self, a):
+        self._is_unate.pop(a, None)
+        self._invalidate(a)
+        return super().__delitem__(a)
+
+    def pop(self, a, *default):
+        if a in self:
+            self._is_unate.pop(a, None)
+            self._invalidate(a)
+        return super().pop(a, *default)
+
+    def popitem(self):
+        a, f = super().popitem()
+        self._is_unate.pop(a, None)
+        self._invalidate(a)
+        return a, f
+
+    def clear(self):
+        super().clear()
+        self._is_unate.clear()
+        self._dnf_clauses.clear()
+        self._node_asp.clear()
+        self._invalidate()
+
+    def update(self, *args, **kwargs):
+        # assignments go through __setitem__ for DNF conversion
+        for a, f in dict(*args, **kwargs).items():
+            self[a] = f
+
+    def setdefault(self, a, f=None):
+        a = self._autokey(a)
+        if a not in self:
+            self[a] = f
+        return self[a]
+
+    def _node_clauses(self, n, f):
+        clauses = self._dnf_clauses.get(n)
+        if clauses is None:
+            clauses = self._dnf_clauses[n] = dnf_clauses(f)
+        return clauses
+
+    def _node_bddasp(self, n, f):
+        frags = self._node_asp.setdefault(n, {})
+        asp = frags.get("bdd")
+        if asp is None:
+            asp = frags["bdd"] = self._bddasp_of_boolfunc(self.ba, f, n)
+        return asp
+
+    def _node_circuitasp(self, n, f):
+        frags = self._node_asp.setdefault(n, {})
+        asp = frags.get("circuit")
+        if asp is None:
+            asp = frags["circuit"] = circuitasp_of_boolfunc(f, n, self.ba)
+        return asp
+
+    def _iter_asp_atoms(self, encoding):
+        """
+        Yields the ASP encoding of the network: ground facts as
+        ``clingo.Symbol`` objects, and the rules of the BDD and circuit
+        encodings as text.
+        Both :py:meth:`.iter_asp_of_bn` and :py:meth:`.add_asp_of_bn` derive
+        from this encoder.
+        """
+        ba = self.ba
+        name = self._name_symbol
+        Function = clingo.Function
+
+        def encode_dnf(n, f):
+            sn = name(n)
+            for cid, c in enumerate(self._node_clauses(n, f)):
+                cid = clingo.Number(cid)
+                for m, v in c:
+                    yield Function("clause", [sn, cid, name(m), _symbol_of_sign[v]])
+        def encode_bdd(n, f):
+            yield self._node_bddasp(n, f)
+        def encode_dnf_bdd(n, f):
+            return (encode_dnf if self._is_unate[n] else encode_bdd)(n, f)
+        def encode_mixed(n, f):
+            yield from encode_dnf(n, f)
+            if self._is_unate[n]:
+                yield Function("unate", [name(n)])
             else:
-                return [f]
-        def literals_of_clause(c):
-            def make_literal(l):
-                if isinstance(l, boolean.NOT):
-                    return (l.args[0].obj, -1)
-                else:
-                    return (l.obj, 1)
-            lits = c.args if isinstance(c, boolean.AND) else [c]
-            return map(make_literal, lits)
-        def encode_dnf(f):
-            facts = []
-            for cid, c in enumerate(clauses_of_dnf(f)):
-                for m, v in literals_of_clause(c):
-                    facts.append(" clause(\"{}\",{},\"{}\",{}).".format(n, cid, m, v))
-            return facts
-
-        facts = []
+                yield self._node_bddasp(n, f)
+        def encode_circuit(n, f):
+            yield self._node_circuitasp(n, f)
+        encode = {
+            "unate-dnf": encode_dnf,
+            "force-unate-dnf": encode_dnf,
+            "dnf-bdd": encode_dnf_bdd,
+            "bdd": encode_bdd,
+            "mixed-dnf-bdd": encode_mixed,
+            "circuit": encode_circuit,
+        }[encoding]
+
         for n, f in self.items():
-            facts.append("node(\"{}\").".format(n))
-            if encoding in ["unate-dnf", "force-unate-dnf"]:
-                f_encoding = "dnf"
-            elif encoding == "dnf-bdd":
-                f_encoding = "dnf" if self._is_unate[n] else "bdd"
+            yield Function("node", [name(n)])
+            if f is ba.FALSE:
+                yield Function("constant", [name(n), _symbol_of_sign[-1]])
+            elif f is ba.TRUE:
+                yield Function("constant", [name(n), _symbol_of_sign[1]])
             else:
-                f_encoding = encoding
-            if f == self.ba.FALSE:
-                f = False
-            elif f == self.ba.TRUE:
-                f = True
-            if isinstance(f, bool):
-                facts.append("constant(\"{}\",{}).".format(n, s2v(f)))
-            elif f_encoding == "dnf":
-                facts.extend(encode_dnf(f))
-            elif f_encoding == "bdd":
-                facts.append(self._bf_impl.bddasp_of_boolfunc(self.ba, f, n))
-            elif f_encoding == "mixed-dnf-bdd":
-                facts.extend(encode_dnf(f))
-                if self._is_unate[n]:
-                    facts.append(f"unate(\"{n}\").")
+                yield from encode(n, f)
+
+    def _asp_atoms(self, encoding):
+        """
+        List of :py:meth:`._iter_asp_atoms`, cached until the network is
+        modified.
+        """
+        atoms = self._asp_cache.get(encoding)
+        if atoms is None:
+            atoms = self._asp_cache[encoding] = list(self._iter_asp_atoms(encoding))
+        return atoms
+
+    def iter_asp_of_bn(self, encoding=None, chunk_size=65536):
+        """
+        Iterator over the ASP facts encoding the network, grouped in chunks of
+        about ``chunk_size`` characters.
+        """
+        if encoding is None:
+            encoding = self.encoding
+        buf = []
+        size = 0
+        for a in self._asp_atoms(encoding):
+            fact = a if isinstance(a, str) else f"{a}."
+            buf.append(fact)
+            size += len(fact) + 1
+            if size >= chunk_size:
+                yield "\n".join(buf)
+                buf = []
+                size = 0
+        if buf:
+            yield "\n".join(buf)
+
+    def asp_of_bn(self, encoding=None):
+        return "\n".join(self.iter_asp_of_bn(encoding))
+
+    def add_asp_of_bn(self, ctl):
+        """
+        Adds the ASP facts encoding the network to the ``base`` program of the
+        given ``clingo.Control`` object.
+        Ground facts are given directly to the backend of ``ctl``, without
+        being parsed; the remaining rules (BDD and circuit encodings) are added
+        as text.
+        Must be called before grounding.
+        """
+        rules = []
+        with ctl.backend() as b:
+            for a in self._asp_atoms(self.encoding):
+                if isinstance(a, str):
+                    rules.append(a)
                 else:
-                    facts.append(self._bf_impl.bddasp_of_boolfunc(self.ba, f, n))
-            elif f_encoding == "circuit":
-                facts.append(circuitasp_of_boolfunc(f, n, self.ba))
-        return "".join(facts)
+                    b.add_rule([b.add_atom(a)])
+        if rules:
+            ctl.add("base", [], "\n".join(rules))
 
     def _file_eval(self):
         if self.encoding == "circuit":
-            f = aspf("eval_circuit.asp")
+            f = _ASP_EVAL_CIRCUIT
         elif self.encoding == "mixed-dnf-bdd":
-            f = aspf("eval_mixed.asp")
+            f = _ASP_EVAL_MIXED
         else:
-            f = aspf("mp_eval.asp")
+            f = _ASP_MP_EVAL
         return f
 
     def rules_eval(self):
-        f = self._file_eval()
-        with open(f, "r") as fp:
-            return fp.read()
+        return _ASP_SRC[self._file_eval()]
     def load_eval(self, solver):
-        f = self._file_eval()
-        solver.load(f)
+        solver.add("base", [], self.rules_eval())
 
     def assert_pc_encoding(self):
         assert self.encoding not in self.nonpc_encodings, "Unsupported encoding"
 
+    def is_total_cfg(self, c):
+        """
+        Returns ``True`` whenever the configuration ``c`` defines the state of
+        every component of the network.
+        """
+        return len(c) >= len(self) and all(n in c for n in self)
+
     def asp_of_cfg(self, e, t, c):
-        facts = ["timepoint({},{}).".format(e,t)]
-        facts += [" mp_state({},{},\"{}\",{}).".format(e,t,n,s2v(s))
-                    for (n,s) in c.items()]
-        facts += [f"1 {{mp_state({e},{t},N,(-1;1))}} 1 :- node(N)."]
-        #facts += [" 1 {{mp_state({},{},\"{}\",(-1;1))}} 1 :- node(N).".format(e,t,n)
-        #                for n in self if n not in c]
+        # fact templates indexed by s > 0
+        tpl = (f' mp_state({e},{t},"%s",-1).', f' mp_state({e},{t},"%s",1).')
+        facts = [f"timepoint({e},{t})."]
+        facts += [tpl[s > 0] % n for (n,s) in c.items()]
+        if not self.is_total_cfg(c):
+            facts.append(f"1 {{mp_state({e},{t},N,(-1;1))}} 1 :- node(N).")
         return "".join(facts)
 
-    def reachability(self, x, y):
+    def _asp_of_cfg_domain(self, e, t, c):
+        """
+        Rules to ground for the configuration ``c``: the timepoint, and the
+        completion choice rules whenever ``c`` is partial.
+        The states of ``c`` are added through the backend, before grounding
+        when ``c`` is total (:py:meth:`._add_total_cfg_to`), otherwise after
+        (:py:meth:`._add_partial_cfg_to`).
+        """
+        if self.is_total_cfg(c):
+            return f"timepoint({e},{t})."
+        return self.asp_of_cfg(e, t, {})
+
+    def _add_total_cfg_to(self, ctl, e, t, c):
+        if self.is_total_cfg(c):
+            self.add_cfg_to(ctl, e, t, c)
+
+    def _add_partial_cfg_to(self, ctl, e, t, c):
+        if not self.is_total_cfg(c):
+            self.add_cfg_to(ctl, e, t, c)
+
+    def symbols_of_cfg(self, e, t, c):
+        """
+        Returns the ``mp_state`` atoms, as ``clingo.Symbol`` objects, of the
+        (partial) configuration ``c`` at timepoint ``t`` of experiment ``e``.
+        The atoms are built once per component, value and timepoint.
+        Keys of ``c`` which are not components of the network are ignored.
+        """
+        atoms = self._state_atoms.get((e, t))
+        if atoms is None:
+            atoms = self._state_atoms[(e, t)] = dict()
+        symbols = []
+        for (n, s) in c.items():
+            if n not in self:
+                continue
+            key = (n, s > 0)
+            a = atoms.get(key)
+            if a is None:
+                a = atoms[key] = clingo.Function("mp_state",
+                        [clingo.parse_term(str(e)), clingo.parse_term(str(t)),
+                            self._name_symbol(n), _symbol_of_state[s > 0]])
+            symbols.append(a)
+        return symbols
+
+    def _name_symbol(self, n):
+        sym = self._name_symbols.get(n)
+        if sym is None:
+            sym = self._name_symbols[n] = clingo.String(n)
+        return sym
+
+    def assumptions_of_cfg(self, e, t, c):
+        """
+        Returns the solver assumptions fixing the (partial) configuration ``c``
+        at timepoint ``t`` of experiment ``e``.
+        """
+        return [(a, True) for a in self.symbols_of_cfg(e, t, c)]
+
+    def add_cfg_to(self, ctl, e, t, c):
+        """
+        Fixes the (partial) configuration ``c`` at timepoint ``t`` of experiment
+        ``e`` by adding ground facts through the backend of ``ctl``, without
+        parsing them.
+        For partial configurations, must be called after grounding the rules
+        given by :py:meth:`.asp_of_cfg`; total configurations can instead be
+        added before grounding, in place of its facts.
+        """
+        with ctl.backend() as b:
+            for a in self.symbols_of_cfg(e, t, c):
+                b.add_rule([b.add_atom(a)])
+
+    def _acquire_ctl(self, key, make):
+        """
+        Returns a grounded ``clingo.Control`` for the query ``key``, built by
+        ``make`` unless cached, and a function to call once solving is done,
+        from a ``finally`` clause, to make the control available to
+        subsequent queries.
+        The control is removed from the cache while in use, so that nested
+        queries ground their own; it is discarded if the network is modified
+        in the meantime.
+        """
+        cache = self._ctl_cache
+        s = cache.pop(key, None)
+        if s is None:
+            s = make()
+        def release():
+            cache[key] = s
+        return s, release
+
+    def _make_reach_ctl(self, s, show_t=None):
+        self.load_eval(s)
+        s.add("base", [], _ASP_SRC[_ASP_MP_POSITIVEREACH])
+        self.add_asp_of_bn(s)
+        e = "default"
+        t1 = 0
+        t2 = 1
+        s.add("base", [], self.asp_of_cfg(e,t1,{}))
+        s.add("base", [], self.asp_of_cfg(e,t2,{}))
+        s.add("base", [], f"is_reachable({e},{t1},{t2}).")
+        if show_t is not None:
+            s.add("base", [], "#show." \
+                f"#show mp_state(E,T,N,V) : mp_state(E,T,N,V), E={e}, T={show_t}.")
+        s.ground([("base",[])])
+        return s
+
+    def reachability(self, x, y, cache_dir=None):
         """
         Returns ``True`` whenever the configuration `y` is reachable from `x`
         with the Most Permissive update mode.
@@ -319,21 +648,73 @@ class MPBooleanNetwork(minibn.BooleanNetwork):
 
         :param dict[str,int] x: initial configuration
         :param dict[str,int] y: target configuration
+        :param str cache_dir: optional directory where results are stored,
+            to be reused across sessions. Entries are keyed by a hash of the
+            network encoding and of `x` and `y`.
+
+        The network is grounded once and the grounding is reused by subsequent
+        calls until the network is modified; `x` and `y` are given as solver
+        assumptions. Results are also kept in memory until the network is
+        modified.
         """
         self.assert_pc_encoding()
-        s = clingo_exists()
-        self.load_eval(s)
-        s.load(aspf("mp_positivereach-np.asp"))
-        s.add("base", [], self.asp_of_bn())
+        if all((x[n] > 0) == (s > 0) for (n, s) in y.items() if n in x):
+            # a configuration matching both x and y reaches itself
+            return True
+        key = (tuple((n, s > 0) for (n, s) in sorted(x.items())),
+                tuple((n, s > 0) for (n, s) in sorted(y.items())))
+        res = self._reach_cache.get(key)
+        if res is not None:
+            return res
+        path = None
+        if cache_dir is not None:
+            path = os.path.join(cache_dir, self._reach_cache_entry(key))
+            if os.path.exists(path):
+                with open(path) as fp:
+                    res = self._reach_cache[key] = fp.read() == "1"
+                return res
+
+        s, release = self._acquire_ctl("reachability",
+                lambda: self._make_reach_ctl(clingo_exists(multishot=True)))
         e = "default"
-        t1 = 0
-        t2 = 1
-        s.add("base", [], self.asp_of_cfg(e,t1,x))
-        s.add("base", [], self.asp_of_cfg(e,t2,y))
-        s.add("base", [], "is_reachable({},{},{}).".format(e,t1,t2))
-        s.ground([("base",[])])
-        res = s.solve()
-        return res.satisfiable
+        assumptions = self.assumptions_of_cfg(e,0,x) \
+                        + self.assumptions_of_cfg(e,1,y)
+        try:
+            res = s.solve(assumptions=assumptions).satisfiable
+        finally:
+            release()
+        self._reach_cache[key] = res
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            # written aside then renamed, so that concurrent readers never
+            # see a partial entry
+            fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as fp:
+                    fp.write("1" if res else "0")
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+        return res
+
+    def _reach_cache_entry(self, key):
+        h = self._bn_digest
+        if h is None:
+            # hash of the functions rather than of their ASP encoding, whose
+            # BDD node names are not stable across sessions
+            h = hashlib.blake2b(digest_size=20)
+            for n in sorted(self):
+                f = self[n]
+                if self.auto_dnf and f is not self.ba.TRUE \
+                        and f is not self.ba.FALSE:
+                    f = self._node_clauses(n, f)
+                h.update(repr((n, str(f) if isinstance(f, boolean.Expression)
+                                    else f)).encode())
+            self._bn_digest = h
+        h = h.copy()
+        h.update(repr(key).encode())
+        return h.hexdigest()
 
     def _ground_rules(self, ctl, rules):
         rules = "\n".join(rules)
@@ -343,22 +724,29 @@ class MPBooleanNetwork(minibn.BooleanNetwork):
     def _fixedpoints(self, reachable_from=None, constraints={}, limit=0):
         e = "fp"
         t2 = "fp"
-        rules = [self.asp_of_cfg(e, t2, constraints)]
+        rules = [self._asp_of_cfg_domain(e, t2, constraints)]
         rules.append(f"mp_reach({e},{t2},N,V) :- mp_state({e},{t2},N,V).")
         rules.append(f":- mp_state({e},{t2},N,V), mp_eval({e},{t2},N,-V).")
-        rules.append(self.asp_of_bn())
         if reachable_from:
             self.assert_pc_encoding()
             t1 = "0"
-            rules.append(open(aspf("mp_positivereach-np.asp")).read())
-            rules.append(self.asp_of_cfg(e,t1,reachable_from))
-            rules.append("is_reachable({},{},{}).".format(e,t1,t2))
+            rules.append(_ASP_SRC[_ASP_MP_POSITIVEREACH])
+            rules.append(self._asp_of_cfg_domain(e,t1,reachable_from))
+            rules.append(f"is_reachable({e},{t1},{t2}).")
+        # decoding assumes that fixpoint/2 is the only shown predicate
         rules.append(f"#show. #show fixpoint(N,V) : mp_state({e},{t2},N,V).")
-        rules.append(open(aspf("mp_eval.asp")).read())
+        rules.append(_ASP_SRC[_ASP_MP_EVAL])
 
-        project = reachable_from and set(self.keys()).difference(reachable_from)
+        project = bool(reachable_from) and not self.is_total_cfg(reachable_from)
         s = clingo_enum(limit=limit, project=project)
+        self.add_asp_of_bn(s)
+        self._add_total_cfg_to(s, e, t2, constraints)
+        if reachable_from:
+            self._add_total_cfg_to(s, e, t1, reachable_from)
         self._ground_rules(s, rules)
+        self._add_partial_cfg_to(s, e, t2, constraints)
+        if reachable_from:
+            self._add_partial_cfg_to(s, e, t1, reachable_from)
         return s
 
     def fixedpoints(self, reachable_from=None, constraints={}, limit=0):
@@ -375,17 +763,12 @@ class MPBooleanNetwork(minibn.BooleanNetwork):
         """
         s = self._fixedpoints(reachable_from=reachable_from,
                               constraints=constraints, limit=limit)
+        nodes = list(self)
         for sol in s.solve(yield_=True):
-            x = {n: None for n in self}
-            data = sol.symbols(shown=True)
-            for d in data:
-                if d.name != "fixpoint":
-                    continue
-                (n, v) = d.arguments
-                n = n.string
-                v = v.number
-                v = 1 if v == 1 else 0
-                x[n] = v
+            args = list(map(_symbol_arguments, sol.symbols(shown=True)))
+            x = dict.fromkeys(nodes)
+            x.update(zip([a[0].string for a in args],
+                         [1 if a[1].number == 1 else 0 for a in args]))
             yield x
 
     def count_fixedpoints(self, reachable_from=None, constraints={}, limit=0):
@@ -402,7 +785,7 @@ class MPBooleanNetwork(minibn.BooleanNetwork):
         """
         s = self._fixedpoints(reachable_from=reachable_from,
                               constraints=constraints, limit=limit)
-        return sum((1 for _ in s.solve(yield_=True)))
+        return _count_models(s)
 
 
     def _trapspaces(self, reachable_from=None, subcube={}, limit=0,
@@ -410,9 +793,9 @@ class MPBooleanNetwork(minibn.BooleanNetwork):
         self.assert_pc_encoding()
 
         rules = []
-        rules.append(self.asp_of_bn())
         rules.append(self.rules_eval())
-        rules.append(open(aspf("mp_attractor.asp")).read())
+        rules.append(_ASP_SRC[_ASP_MP_ATTRACTOR])
+        # decoding assumes that attractor/2 is the only shown predicate
         rules.append("#show attractor/2.")
 
         e = "__a"
@@ -421,51 +804,56 @@ class MPBooleanNetwork(minibn.BooleanNetwork):
             rules.append(f"{{ mp_reach({e},{t2},N,(-1;1)): node(N) }} {len(self)*2-1}.")
         if reachable_from:
             t1 = "0"
-            rules.append(open(aspf("mp_positivereach-np.asp")).read())
-            rules.append(self.asp_of_cfg(e,t1,reachable_from))
-            rules.append("is_reachable({},{},{}).".format(e,t1,t2))
-            rules.append("mp_state({},{},N,V) :- attractor(N,V).".format(e,t2))
-
-        for n, b in subcube.items():
-            if isinstance(b, str):
-                b = int(b)
-            if b not in [0,1]:
-                continue
-            rules.append(":- mp_reach({},{},\"{}\",{}).".format(e,t2,n,s2v(1-b)))
+            rules.append(_ASP_SRC[_ASP_MP_POSITIVEREACH])
+            rules.append(self._asp_of_cfg_domain(e,t1,reachable_from))
+            rules.append(f"is_reachable({e},{t1},{t2}).")
+            rules.append(f"mp_state({e},{t2},N,V) :- attractor(N,V).")
 
-        project = reachable_from and set(self.keys()).difference(reachable_from)
+        project = bool(reachable_from) and not self.is_total_cfg(reachable_from)
         solver = clingo_subsets if mode == "min" else clingo_supsets
         s = solver(limit=limit, project=project)
+        self.add_asp_of_bn(s)
+        if reachable_from:
+            self._add_total_cfg_to(s, e, t1, reachable_from)
         self._ground_rules(s, rules)
+        if reachable_from:
+            self._add_partial_cfg_to(s, e, t1, reachable_from)
+
+        e = clingo.Function(e)
+        t2 = clingo.Function(t2)
+        with s.backend() as backend:
+            for n, b in subcube.items():
+                if isinstance(b, str):
+                    b = int(b)
+                if b not in [0,1]:
+                    continue
+                a = clingo.Function("mp_reach",
+                        [e, t2, self._name_symbol(n), _symbol_of_sign[-1 if b else 1]])
+                backend.add_rule([], [backend.add_atom(a)])
         return s
 
     def _yield_trapspaces(self, *args, star="*", **kwargs):
         s = self._trapspaces(*args, **kwargs)
+        nodes = list(self)
+        value = {1: 1, -1: 0, 2: star}
         for sol in s.solve(yield_=True):
-            attractor = {n: None for n in self}
-            data = sol.symbols(shown=True)
-            for d in data:
-                if d.name != "attractor":
-                    continue
-                (n, v) = d.arguments
-                n = n.string
-                v = v.number
-                if v == 2:
-                    v = star
-                else:
-                    v = 1 if v == 1 else 0
-                if attractor[n] is not None:
-                    if star is not None:
-                        attractor[n] = star
-                    else:
-                        del attractor[n]
-                else:
-                    attractor[n] = v
+            args = list(map(_symbol_arguments, sol.symbols(shown=True)))
+            names = [a[0].string for a in args]
+            attractor = dict.fromkeys(nodes)
+            attractor.update(zip(names, [value[a[1].number] for a in args]))
+            if len(names) > len(nodes):
+                # components with both values are free in the trap space
+                for n, c in Counter(names).items():
+                    if c > 1:
+                        if star is not None:
+                            attractor[n] = star
+                        else:
+                            del attractor[n]
             yield attractor
 
     def _count_trapspaces(self, *args, **kwargs):
         s = self._trapspaces(*args, **kwargs)
-        return sum((1 for _ in s.solve(yield_=True)))
+        return _count_models(s)
 
     def attractors(self, reachable_from=None, constraints={}, limit=0, star='*'):
         """
@@ -527,9 +915,15 @@ class MPBooleanNetwork(minibn.BooleanNetwork):
                                 mode="max")
 
     def has_cyclic_attractor(self):
-        for a in self.attractors():
-            if "*" in a.values():
-                return True
+        # A constraint requiring a free component would break the subset
+        # minimality of the enumeration; instead, attractors are enumerated
+        # until one shows a component with both values, without decoding them.
+        n = len(self)
+        s = self._trapspaces(mode="min")
+        with s.solve(yield_=True) as sols:
+            for sol in sols:
+                if len(sol.symbols(shown=True)) > n:
+                    return True
         return False
 
     def reachable_from(self, x, reversed=False):
@@ -542,28 +936,35 @@ class MPBooleanNetwork(minibn.BooleanNetwork):
 
         Whenever ``reversed`` is ``True``, yields over the configurations that can
         reach `x` instead.
+
+        As with :py:meth:`.reachability`, the grounding is reused across calls.
         """
         self.assert_pc_encoding()
-        s = clingo_enum()
-        self.load_eval(s)
-        s.load(aspf("mp_positivereach-np.asp"))
-        s.add("base", [], self.asp_of_bn())
-        e = "default"
         t1 = 0
         t2 = 1
-        s.add("base", [], self.asp_of_cfg(e,t1,x if not reversed else {}))
-        s.add("base", [], self.asp_of_cfg(e,t2,{} if not reversed else x))
-        s.add("base", [], "is_reachable({},{},{}).".format(e,t1,t2))
-        t = t2 if not reversed else t1
-        s.add("base", [], "#show." \
-            f"#show mp_state(E,T,N,V) : mp_state(E,T,N,V), E={e}, T={t}.")
-        s.ground([("base",[])])
-
-        def cfg_of_asp(atoms):
-            return {a.arguments[2].string: v2s(a.arguments[3].number) for a in atoms}
-        for sol in s.solve(yield_=True):
-            data = sol.symbols(shown=True)
-            yield cfg_of_asp(data)
+        tx = t1 if not reversed else t2
+        ty = t2 if not reversed else t1
+        s, release = self._acquire_ctl(("reachable_from", reversed),
+                lambda: self._make_reach_ctl(clingo_enum(multishot=True),
+                                                show_t=ty))
+        try:
+            yield from self._iter_reachable(s, x, tx)
+        finally:
+            release()
+
+    def _iter_reachable(self, s, x, tx):
+        """
+        Iterator over the configurations shown by the grounded reachability
+        control ``s`` (see :py:meth:`._make_reach_ctl`) when fixing ``x`` at
+        timepoint ``tx``.
+        """
+        assumptions = self.assumptions_of_cfg("default",tx,x)
+        with s.solve(yield_=True, assumptions=assumptions) as sols:
+            for sol in sols:
+                args = list(map(_symbol_arguments, sol.symbols(shown=True)))
+                names = [a[2].string for a in args]
+                values = [a[3].number for a in args]
+                yield dict(zip(names, map(v2s, values)))
 
     def dynamics(self, update_mode="mp", **kwargs):
         """
@@ -576,11 +977,26 @@ class MPBooleanNetwork(minibn.BooleanNetwork):
         return super().dynamics(update_mode=update_mode, **kwargs)
 
 
+@functools.lru_cache(maxsize=16)
+def _load_cached(path, mtime_ns, opts):
+    return MPBooleanNetwork.load(path, **dict(opts))
+
 def load(filename, **opts):
     """
     Create a :py:class:`.MPBooleanNetwork` object from ``filename`` in BoolNet
     format; ``filename`` can be a local file or an URL.
+
+    Networks loaded from local files are cached, until the file is modified;
+    each call returns a copy of the cached network.
     """
+    if os.path.isfile(filename):
+        path = os.path.abspath(filename)
+        try:
+            bn = _load_cached(path, os.stat(path).st_mtime_ns,
+                                tuple(sorted(opts.items())))
+        except TypeError: # unhashable options
+            return MPBooleanNetwork.load(filename, **opts)
+        return bn.copy()
     return MPBooleanNetwork.load(filename, **opts)
 
 class MostPermissiveDynamics(minibn.UpdateModeDynamics):
@@ -591,6 +1007,8 @@ class MostPermissiveDynamics(minibn.UpdateModeDynamics):
         super().__init__(model, **opts)
 
     def __call__(self, x):
-        return self.model.reachable_from(x)
+        # consumed at once, so that the grounding of reachable_from is
+        # released to the next call
+        return list(self.model.reachable_from(x))
 
 __all__ = ["load", "MPBooleanNetwork", "MostPermissiveDynamics"]
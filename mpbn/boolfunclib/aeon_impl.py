@@ -1,4 +1,3 @@
-import networkx as nx
 import clingo
 
 from boolean import boolean
@@ -9,6 +8,17 @@ from typing import Optional
 from biodivine_aeon import Bdd, BddPointer
 from biodivine_aeon import BddVariableSet, BddValuation
 
+def _and(x, y):
+    """
+    Conjunction for `Bdd.apply_with_exists`, where `None` stands for a
+    not-yet-known operand.
+    """
+    if x is False or y is False:
+        return False
+    if x is None or y is None:
+        return None
+    return True
+
 def is_unate_symbolic(f: Bdd) -> boolean:
     """
     Returns `True` if the given `biodivine_aeon.Bdd` represents a unate function
@@ -18,20 +28,22 @@ def is_unate_symbolic(f: Bdd) -> boolean:
     symbolically expressing the inputs where decreasing the input increases the
     output (i.e. a counterexample to positive monotonicity), or vice versa.
     """
-    variables = f.__ctx__().variable_ids()
+    ctx = f.__ctx__()
     f_false = f.l_not()
     f_true = f
-    for var in f.support_set():
-        var_is_true = f.__ctx__().mk_literal(var, True)
-        var_is_false = f.__ctx__().mk_literal(var, False)
-        
-        f_1_to_0 = f_false.l_and(var_is_true).r_exists(var)
-        f_0_to_1 = f_true.l_and(var_is_false).r_exists(var)
-        is_positive = f_0_to_1.l_and(f_1_to_0).r_exists(variables).l_not().is_true()        
-        
-        f_0_to_0 = f_false.l_and(var_is_false).r_exists(var)
-        f_1_to_1 = f_true.l_and(var_is_true).r_exists(var)
-        is_negative = f_0_to_0.l_and(f_1_to_1).r_exists(variables).l_not().is_true()
+    support = f.support_set()
+    literals = {var: (ctx.mk_literal(var, True), ctx.mk_literal(var, False))
+                    for var in support}
+    for var in support:
+        var_is_true, var_is_false = literals[var]
+
+        f_1_to_0 = Bdd.apply_with_exists(f_false, var_is_true, [var], _and)
+        f_0_to_1 = Bdd.apply_with_exists(f_true, var_is_false, [var], _and)
+        is_positive = f_0_to_1.l_and(f_1_to_0).is_false()
+
+        f_0_to_0 = Bdd.apply_with_exists(f_false, var_is_false, [var], _and)
+        f_1_to_1 = Bdd.apply_with_exists(f_true, var_is_true, [var], _and)
+        is_negative = f_0_to_0.l_and(f_1_to_1).is_false()
 
         # An input cannot be both positive and negative at the same time.
         assert not (is_positive and is_negative)
@@ -41,6 +53,19 @@ def is_unate_symbolic(f: Bdd) -> boolean:
     return True
 
 
+def _reduce_balanced(op, bdds):
+    """
+    Combines the given BDDs with the binary operation `op` pairwise, as a
+    balanced tree, so that intermediate BDDs stay small.
+    """
+    bdds = list(bdds)
+    while len(bdds) > 1:
+        pairs = [op(bdds[i], bdds[i+1]) for i in range(0, len(bdds)-1, 2)]
+        if len(bdds) % 2:
+            pairs.append(bdds[-1])
+        bdds = pairs
+    return bdds[0]
+
 def ba_to_bdd(ba: boolean.BooleanAlgebra, f: boolean.Expression, ctx: BddVariableSet | None = None) -> Bdd:
     """
     Takes a `boolean.Expression` (with the associated `boolean.BooleanAlgebra`) and
@@ -50,14 +75,23 @@ def ba_to_bdd(ba: boolean.BooleanAlgebra, f: boolean.Expression, ctx: BddVariabl
     variable IDs to names. You can provide your own context, or one will be created for you
     (to access the underlying context object, use `bdd.__ctx__()`).
     """
-    ba_vars = f.symbols
-    variables = sorted([ str(var) for var in ba_vars ])
+    # Variables are ordered by first appearance in `f`, which keeps variables
+    # of a same sub-expression close in the BDD order.
+    variables = list(dict.fromkeys(str(var) for var in f.get_symbols()))
     if ctx is None:        
         ctx = BddVariableSet(variables)
     else:
         # Check that all variables that exist in `f` also exist in `ctx`.
         assert all((ctx.find_variable(var) is not None) for var in variables)
+    # BDDs of already converted sub-expressions, by object identity
+    memo = {}
     def ba_to_bdd_rec(f: boolean.Expression) -> Bdd:
+        key = id(f)
+        result = memo.get(key)
+        if result is None:
+            result = memo[key] = ba_to_bdd_node(f)
+        return result
+    def ba_to_bdd_node(f: boolean.Expression) -> Bdd:
         if type(f) is ba.TRUE or isinstance(f, boolean._TRUE):
             return ctx.mk_const(True)
         if type(f) is ba.FALSE or isinstance(f, boolean._FALSE):
@@ -68,15 +102,13 @@ def ba_to_bdd(ba: boolean.BooleanAlgebra, f: boolean.Expression, ctx: BddVariabl
             assert len(f.args) == 1, "Cannot transform NOT with more than one argument."
             return ba_to_bdd_rec(f.args[0]).l_not()
         if type(f) is ba.AND:
-            result = ctx.mk_const(True)
-            for arg in f.args:
-                result = result.l_and(ba_to_bdd_rec(arg))
-            return result
+            if not f.args:
+                return ctx.mk_const(True)
+            return _reduce_balanced(Bdd.l_and, map(ba_to_bdd_rec, f.args))
         if type(f) is ba.OR:
-            result = ctx.mk_const(False)
-            for arg in f.args:
-                result = result.l_or(ba_to_bdd_rec(arg))
-            return result        
+            if not f.args:
+                return ctx.mk_const(False)
+            return _reduce_balanced(Bdd.l_or, map(ba_to_bdd_rec, f.args))
         raise NotImplementedError(str(f), type(f))
         
     return ba_to_bdd_rec(f)
@@ -92,21 +124,20 @@ def bdd_to_dnf(ba: boolean.BooleanAlgebra, f: Bdd) -> boolean.Expression:
     ctx = f.__ctx__()
     # Technically, `optimize=True` should be set by default, but just in case.
     dnf = f.to_dnf(optimize=True)
-    # Maps BDD variables to BooleanAlgebra Symbols.
-    var_to_symbol = { var: ba.Symbol(ctx.get_variable_name(var)) for var in ctx.variable_ids() }
+    # Maps BDD literals to BooleanAlgebra literals.
+    literals = {}
+    for var in f.support_set():
+        symbol = ba.Symbol(ctx.get_variable_name(var))
+        literals[(var, True)] = symbol
+        literals[(var, False)] = ba.NOT(symbol)
     ba_clauses = []
     for clause in dnf:
-        literals = []
-        for (var, value) in clause.items():            
-            if value:
-                literals.append(var_to_symbol[var])
-            else:
-                literals.append(ba.NOT(var_to_symbol[var]))                
-        assert len(literals) > 0
-        if len(literals) == 1:
-            ba_clauses.append(literals[0])
+        clause = [literals[lit] for lit in clause.items()]
+        assert len(clause) > 0
+        if len(clause) == 1:
+            ba_clauses.append(clause[0])
         else:
-            ba_clauses.append(ba.AND(*literals))
+            ba_clauses.append(ba.AND(*clause))
     assert len(ba_clauses) > 0 
     if len(ba_clauses) == 1:
         return ba_clauses[0]
@@ -127,30 +158,43 @@ def asp_of_bdd(var_name, bdd: Bdd) -> list[str]:
     if bdd.is_true():
         return [f"bdd({clingo.String(var_name)},1)"]
     
-    _rules = {}
-    def _rec(node: BddPointer, node_name: Optional[str] = None) -> str:
+    ctx = bdd.__ctx__()
+    root = bdd.root()
+    # ASP terms of the visited nodes, by node pointer.
+    terms = {}
+    var_terms = {}
+    atoms = []
+    # Iterative post-order traversal: a node is emitted once both its
+    # children have been.
+    stack = [(root, False)]
+    while stack:
+        (node, expanded) = stack.pop()
+        key = int(node)
+        if key in terms:
+            # The node was already declared.
+            continue
         if node.is_zero():
-            return "-1"
+            terms[key] = "-1"
+            continue
         if node.is_one():
-            return "1"
-        if node_name is None:
-            node_name = f"{var_name}_n{int(node)}"        
-        node_name_clingo = clingo.String(node_name)
-        if node_name_clingo in _rules:
-            # The node was already declared.
-            return node_name_clingo
+            terms[key] = "1"
+            continue
+        (lo, hi) = bdd.node_links(node)
+        if not expanded:
+            stack.append((node, True))
+            stack.append((hi, False))
+            stack.append((lo, False))
+            continue
         node_var = bdd.node_variable(node)
         assert node_var is not None # Only `None` if node is terminal.
-        (lo, hi) = bdd.node_links(node)
-        var = clingo.String(bdd.__ctx__().get_variable_name(node_var))
-        lo = _rec(lo)
-        hi = _rec(hi)
-        atom = f"bdd({node_name_clingo},{var},{lo},{hi})"
-        _rules[node_name_clingo] = atom
-        return node_name_clingo
-    _rec(bdd.root(), var_name)
+        var = var_terms.get(node_var)
+        if var is None:
+            var = var_terms[node_var] = clingo.String(ctx.get_variable_name(node_var))
+        node_name = var_name if key == int(root) else f"{var_name}_n{key}"
+        node_name_clingo = terms[key] = clingo.String(node_name)
+        atoms.append(f"bdd({node_name_clingo},{var},{terms[int(lo)]},{terms[int(hi)]})")
 
-    return list(_rules.values())
+    return atoms
 
 def bddasp_of_boolfunc(ba, f, var_name):
     f_bdd = ba_to_bdd(ba, f)
@@ -172,31 +216,56 @@ def bn_of_asynchronous_transition_graph(adyn, names,
     mapping component names to a string representation of their Boolean expression.
     """
     relabel = {label: parse_node(label) for label in adyn.nodes()}
-    adyn = nx.relabel_nodes(adyn, relabel)
-    n = len(next(iter(adyn.nodes)))
+    n = len(next(iter(relabel.values())))
     assert n == len(names), "list of component names and dimension of configuraitons seem different"
     assert adyn.number_of_nodes() == 2**n, "unexpected number of nodes in the transition graph"
 
     bdd_ctx = BddVariableSet(names)
 
+    # Configurations from which component i can flip, by value of i, gathered
+    # in one pass over the transitions.
+    flips = [(set(), set()) for _ in range(n)]
+    for (x, y) in adyn.edges():
+        x, y = relabel[x], relabel[y]
+        for i in range(n):
+            if x[i] != y[i]:
+                flips[i][x[i]].add(x)
+                break
+
+    # Component i is at 1 in the next configuration iff it is at 1 and
+    # cannot flip, or it is at 0 and can flip.
+    variables = bdd_ctx.variable_ids()
+    half = 2**(n-1)
+    # a configuration usually appears in the flip sets of several components
+    valuations = {}
+    def valuation(x):
+        v = valuations.get(x)
+        if v is None:
+            v = valuations[x] = BddValuation(bdd_ctx, list(x))
+        return v
+    def mk_flip(i, value):
+        xs = flips[i][value]
+        if not xs:
+            return bdd_ctx.mk_false()
+        if len(xs) == half:
+            return bdd_ctx.mk_literal(variables[i], bool(value))
+        return bdd_ctx.mk_dnf([valuation(x) for x in xs])
     f = []
     for i in range(n):
-        pos = []
-        for x in adyn.nodes():
-            dx = list(x)
-            dx[i] = 1-x[i]
-            y = dx if tuple(dx) in adyn[x] else x
-            target = y[i]
-            if target:
-                pos.append(BddValuation(bdd_ctx, list(x)))
-        if len(pos) == 0:
-            f.append(bdd_ctx.mk_false())
-        else:
-            f.append(bdd_ctx.mk_dnf(pos))
+        flip = mk_flip(i, 0).l_or(mk_flip(i, 1))
+        f.append(bdd_ctx.mk_literal(variables[i], True).l_xor(flip))
 
     bn = bn_class()
+    # Components with identical update functions share their DNF.
+    dnfs = {}
     for (i, name) in enumerate(names):
-        bn[name] = bdd_to_dnf(bn.ba, f[i])
+        key = f[i].data_bytes()
+        dnf = dnfs.get(key)
+        if dnf is None:
+            dnf = dnfs[key] = bdd_to_dnf(bn.ba, f[i])
+        bn[name] = dnf
     if simplify:
-        bn = bn.simplify()
+        # DNFs from to_dnf(optimize=True) are already minimized: skip the
+        # (costly and enlarging) DNF-specific simplifications
+        bn = bn.simplify(suspect_dnf=False)
     return bn
@@ -1,11 +1,14 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
 import clingo
-import networkx as nx
 
 from pyeda.boolalg.minimization import *
 import pyeda.boolalg.expr
-from pyeda.inter import expr
+from pyeda.inter import expr, exprvar, truthtable, And, Or, Not
 from pyeda.boolalg import bdd
 
+from boolean import boolean
 from colomoto import minibn
 
 def expr2str(ex):
@@ -52,30 +55,54 @@ def expr2bpy(ex, ba):
         return ba.AND(*(expr2bpy(x, ba) for x in ex.xs))
     raise NotImplementedError(str(ex), type(ex))
 
+def bpy2expr(f, ba):
+    """
+    converts a boolean.py Boolean expression into a pyeda one
+    """
+    if isinstance(f, ba.Symbol):
+        return exprvar(str(f.obj))
+    elif isinstance(f, boolean._TRUE):
+        return expr(1)
+    elif isinstance(f, boolean._FALSE):
+        return expr(0)
+    elif isinstance(f, ba.NOT):
+        return Not(bpy2expr(f.args[0], ba))
+    elif isinstance(f, ba.OR):
+        return Or(*(bpy2expr(x, ba) for x in f.args))
+    elif isinstance(f, ba.AND):
+        return And(*(bpy2expr(x, ba) for x in f.args))
+    raise NotImplementedError(str(f), type(f))
+
 def asp_of_bdd(bid, b):
-    _rules = dict()
-    def register(node, nid=None):
-        if node is bdd.BDDNODEONE:
-            if nid is not None:
-                _rules[bid] = f"bdd({clingo.String(nid)},1)"
-            return 1
-        elif node is bdd.BDDNODEZERO:
-            if nid is not None:
-                _rules[bid] = f"bdd({clingo.String(nid)},-1)"
-            return -1
-        nid = clingo.String(f"{bid}_n{id(node)}" if nid is None else nid)
-        if nid not in _rules:
-            var = clingo.String(bdd._VARS[node.root].qualname)
-            lo = register(node.lo)
-            hi = register(node.hi)
-            a = f"bdd({nid},{var},{lo},{hi})"
-            _rules[nid] = a
-        return nid
-    register(b.node, bid)
-    return _rules.values()
+    root = b.node
+    if root is bdd.BDDNODEONE:
+        return [f"bdd({clingo.String(bid)},1)"]
+    elif root is bdd.BDDNODEZERO:
+        return [f"bdd({clingo.String(bid)},-1)"]
+    terms = {id(bdd.BDDNODEONE): 1, id(bdd.BDDNODEZERO): -1}
+    var_terms = {}
+    _rules = []
+    # iterative post-order traversal, emitting a node after its children
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        key = id(node)
+        if key in terms:
+            continue
+        if not expanded:
+            stack.append((node, True))
+            stack.append((node.hi, False))
+            stack.append((node.lo, False))
+            continue
+        var = var_terms.get(node.root)
+        if var is None:
+            var = var_terms[node.root] = clingo.String(bdd._VARS[node.root].qualname)
+        nid = terms[key] = clingo.String(bid if node is root else f"{bid}_n{key}")
+        _rules.append(f"bdd({nid},{var},{terms[id(node.lo)]},{terms[id(node.hi)]})")
+    return _rules
 
 def bddasp_of_boolfunc(ba, f, i):
-    e = expr(str(f).replace("!","~"))
+    e = bpy2expr(f, ba)
     b = bdd.expr2bdd(e)
     atoms = asp_of_bdd(i, b)
     return "\n".join((f"{a}." for a in atoms))
@@ -85,7 +112,7 @@ def make_dnf_boolfunc(ba, f, try_unate_hard=False, simplify=True):
     try_unate_hard: use costly CNF/DNF transformations
     simplify: use boolean.py simplification method
     """
-    e = expr(str(f).replace("!","~"))
+    e = bpy2expr(f, ba)
     e = e.to_dnf()
     e = e.simplify()
     e = expr2bpy(e, ba)
@@ -95,10 +122,35 @@ def make_dnf_boolfunc(ba, f, try_unate_hard=False, simplify=True):
         e = e.simplify()
     return e
 
+def _dnf_of_cfgs(names, cfgs):
+    """
+    string representation of the minimized DNF covering the configurations
+    `cfgs`
+    """
+    if not cfgs:
+        return expr2str(expr("0"))
+    if len(cfgs) == 2**len(names):
+        return expr2str(expr("1"))
+    # components fixed in every configuration: if they are enough to account
+    # for the number of configurations, these span a sub-hypercube whose
+    # conjunction of literals is the minimal DNF
+    x0 = cfgs[0]
+    fixed = [i for i in range(len(names)) if all(x[i] == x0[i] for x in cfgs)]
+    if len(cfgs) == 2**(len(names) - len(fixed)):
+        return expr2str(And(*(exprvar(names[i]) if x0[i] else
+                                Not(exprvar(names[i])) for i in fixed)))
+    # truth table indexed by configurations, component i being the i-th bit
+    outputs = [0] * 2**len(names)
+    for x in cfgs:
+        outputs[sum(v << i for i, v in enumerate(x))] = 1
+    e, = espresso_tts(truthtable(list(map(exprvar, names)), outputs))
+    return expr2str(e)
+
 def bn_of_asynchronous_transition_graph(adyn, names,
             parse_node=(lambda n: tuple(map(int, n))),
             bn_class=minibn.BooleanNetwork,
-            simplify=True):
+            simplify=True,
+            processes=1):
     """
     Convert the transition graph of a (fully) asynchronous Boolean network to
     a propositional logic representation.
@@ -108,36 +160,42 @@ def bn_of_asynchronous_transition_graph(adyn, names,
     node. By default, it is assumed that nodes are strings of binary values.
     Returned object will be of `bn_class`, instantiated with a dictionnary
     mapping component names to a string representation of their Boolean expression.
+    The minimization of the components can be distributed over `processes`
+    processes.
     """
     relabel = {label: parse_node(label) for label in adyn.nodes()}
-    adyn = nx.relabel_nodes(adyn, relabel)
-    n = len(next(iter(adyn.nodes)))
+    states = list(relabel.values())
+    n = len(states[0])
     assert n == len(names), "list of component names and dimension of configuraitons seem different"
     assert adyn.number_of_nodes() == 2**n, "unexpected number of nodes in the transition graph"
 
-    def expr_of_cfg(x):
-        e = "&".join(f"{'~' if not v else ''}{names[i]}" for i, v in enumerate(x))
-        return f"({e})"
+    # configurations from which component i can flip, gathered in one pass
+    # over the transitions
+    flips = [set() for _ in range(n)]
+    for (x, y) in adyn.edges():
+        x, y = relabel[x], relabel[y]
+        for i in range(n):
+            if x[i] != y[i]:
+                flips[i].add(x)
+                break
 
-    f = []
-    for i in range(n):
-        pos = []
-        for x in adyn.nodes():
-            dx = list(x)
-            dx[i] = 1-x[i]
-            y = dx if tuple(dx) in adyn[x] else x
-            target = y[i]
-            if target:
-                pos.append(x)
-        if not pos:
-            f.append(expr("0"))
-        else:
-            e = expr("|".join(map(expr_of_cfg,pos)))
-            e, = espresso_exprs(e.to_dnf())
-            f.append(e)
-    f = map(expr2str, f)
-    f = bn_class(dict(zip(names, f)))
+    # i is at 1 next iff it is at 1 and cannot flip, or at 0 and can flip
+    pos = [[x for x in states if x[i] != (x in flips[i])] for i in range(n)]
+    # components sharing the same configurations are minimized only once
+    uniq = {}
+    for cfgs in pos:
+        uniq.setdefault(tuple(cfgs), cfgs)
+    uniq_pos = list(uniq.values())
+    if processes > 1:
+        with ProcessPoolExecutor(processes) as executor:
+            dnfs = list(executor.map(_dnf_of_cfgs, repeat(names), uniq_pos))
+    else:
+        dnfs = list(map(_dnf_of_cfgs, repeat(names), uniq_pos))
+    dnfs = dict(zip(uniq, dnfs))
+    f = bn_class({name: dnfs[tuple(cfgs)] for name, cfgs in zip(names, pos)})
     if simplify:
-        f = f.simplify()
+        # espresso DNFs are already minimized: skip the (costly and enlarging)
+        # DNF-specific simplifications
+        f = f.simplify(suspect_dnf=False)
     return f
 
@@ -67,6 +67,7 @@ def main():
     print()
     print("Reachable attractors:")
     A = list(f.attractors(reachable_from=x0))
+    attractors = {"Wild type": list(A)}
     for i, a in enumerate(A):
         print(f"{i}. {str_attractor(a)}")
 
@@ -79,8 +80,9 @@ def main():
             return f
         f_mutants = {name: patch_model(f, patch) for name, patch in
                         setup["mutants"].items()}
-        for f_muted in f_mutants.values():
-            for a in f_muted.attractors(reachable_from=x0):
+        for name, f_muted in f_mutants.items():
+            attractors[name] = list(f_muted.attractors(reachable_from=x0))
+            for a in attractors[name]:
                 if a not in A:
                     print(f"{len(A)}. {str_attractor(a)}")
                     A.append(a)
@@ -109,16 +111,17 @@ def main():
         for exp in setup["experiments"]:
             if "name" not in exp:
                 continue
+            rates = getattr(mpbn_sim, f"{exp['rates']}_rates")
+            depth = getattr(mpbn_sim, f"{exp['depth']}_depth")
+            rates_args = exp.get("rate_args", {})
+            depth_args = exp.get("depth_args", {})
+            # rates and depth samplers only depend on the experiment
+            margs = (f, x0, A, nb_sims,
+                        depth(f, **depth_args),
+                        rates(f, **rates_args))
             for _ in range(args.repeat):
-                rates = getattr(mpbn_sim, f"{exp['rates']}_rates")
-                depth = getattr(mpbn_sim, f"{exp['depth']}_depth")
-                rates_args = exp.get("rate_args", {})
-                depth_args = exp.get("depth_args", {})
                 print(f"- {depth.__name__}{depth_args}\t{rates.__name__}{rates_args}")
                 def do():
-                    margs = (f, x0, A, nb_sims,
-                                depth(f, **depth_args),
-                                rates(f, **rates_args))
                     kwargs = {}
                     meth = mpbn_sim.estimate_reachable_attractors_probabilities
                     if args.nb_jobs != 1:
@@ -149,7 +152,7 @@ def main():
                 result["results"].clear()
         for name, f_mut in [("Wild type", f)] + list(f_mutants.items()):
             print_name(name)
-            B = list(f_mut.attractors(reachable_from=x0))
+            B = attractors[name]
             def ensure_attractor(a):
                 if a in B:
                     return a
@@ -1,23 +1,42 @@
-
-from itertools import combinations, chain
+"""
+Stochastic simulation of Most Permissive Boolean Networks.
+
+The low-level functions (:py:func:`.reachable_spaces`,
+:py:func:`.sample_configuration`, :py:func:`.step`) work on configurations
+packed into integers by :py:meth:`.MPBNSim.pack`: :py:func:`.step` returns
+the sampled configuration (or ``None`` when none can be reached) instead of
+modifying a dictionary in place and returning a boolean, as it used to.
+The ``sample_*`` and ``estimate_*`` functions take and return configurations
+as dictionaries.
+"""
+
+
+from bisect import bisect_right
+from collections import deque
+from itertools import accumulate
 from multiprocessing import SimpleQueue, Process, current_process, cpu_count
 import os
+import warnings
 
 import numpy as np
-from numpy.random import uniform, choice, seed
-from scipy.special import binom
+from numpy.random import seed
 
-from mpbn import MPBooleanNetwork
+from mpbn import MPBooleanNetwork, dnf_clauses
 
 from tqdm import tqdm
 
-import re
-
-BNET_SYMBOL_PAT = re.compile(r"[\w\.:]+")
-
 class MPBNSim(MPBooleanNetwork):
+    """
+    Boolean network specialized for simulation.
+
+    Components are indexed by their order in the network, and configurations
+    and sets of components are packed into integers: bit `i` stands for the
+    component of index `i` (see :py:meth:`.pack` and :py:meth:`.mask`).
+    """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs, encoding="unate-dnf")
+        self.names = list(self)
+        self.index = {i: k for k, i in enumerate(self.names)}
         g = self.influence_graph()
         self.deps = {}
         for i in g:
@@ -26,67 +45,134 @@ class MPBNSim(MPBooleanNetwork):
             self.deps[i][d["sign"]].append(j)
         for i in g:
             self.deps[i][0] = self.deps[i][1] + self.deps[i][-1]
+        # masks of positive and negative regulators, by component index
+        self.pos_mask = [self.mask(self.deps[i][1]) for i in self.names]
+        self.neg_mask = [self.mask(self.deps[i][-1]) for i in self.names]
 
         """
         boolean logic compilation
         """
-        self.compiled_f = {}
-        def repl_symbol(match):
-            d = match.group(0)
-            if d == "1":
-                return "True"
-            elif d == "0":
-                return "False"
-            else:
-                return f"x['{d}']"
+        # clauses of the DNF of each component, as (positive literals mask,
+        # negative literals mask) couples
+        self.clauses = []
         for i, fi in self.items():
-            fi_py = BNET_SYMBOL_PAT.sub(repl_symbol, str(fi))
-            fi_py = fi_py.replace("!", "not ")
-            fi_py = fi_py.replace("&", " and ")
-            fi_py = fi_py.replace("|", " or ")
-            self.compiled_f[i] = eval(f"lambda x: ({fi_py})")
-
-    def local_eval(self, i, x):
-        return self.compiled_f[i](x)
-
-    LIM_MIN = [(1, 0), (-1, 1)]
-    LIM_MAX = [(1, 1), (-1, 0)]
-    def _lim_configuration(self, x, i, H, lim):
-        y = x.copy()
-        for (s, v) in lim:
-            for j in self.deps[i][s]:
-                if j in H:
-                    y[j] = v
-        return y
-    def min_configuration(self, x, i, H):
-        return self._lim_configuration(x, i, H, self.LIM_MIN)
-    def max_configuration(self, x, i, H):
-        return self._lim_configuration(x, i, H, self.LIM_MAX)
-
-
-def can_flip(f, x, i, H, v):
+            if fi is self.ba.TRUE:
+                clauses = [(0, 0)]
+            elif fi is self.ba.FALSE:
+                clauses = []
+            else:
+                clauses = [(self.mask(j for (j, s) in c if s > 0),
+                            self.mask(j for (j, s) in c if s < 0))
+                            for c in dnf_clauses(fi)]
+            self.clauses.append(clauses)
+        # compiled_f[k](x, y) evaluates f[k] reading its positive literals
+        # in x and its negative literals in y. As f is locally monotone,
+        # f[k] on the configuration maximizing (resp. minimizing) it within a
+        # subcube is then obtained from the subcube bounds, without building
+        # that configuration (see spread).
+        self.compiled_f = []
+        for clauses in self.clauses:
+            fi_py = " or ".join(f"(x & {p} == {p} and not y & {n})"
+                                    for (p, n) in clauses) or "False"
+            self.compiled_f.append(eval(f"lambda x, y: {fi_py}"))
+
+        # binom_table[h,k] is the number of subsets of size k of h components
+        n = len(self)
+        self.binom_table = np.zeros((n+1, n+1))
+        self.binom_table[:,0] = 1
+        for h in range(1, n+1):
+            self.binom_table[h,1:h+1] = self.binom_table[h-1,1:h+1] \
+                                        + self.binom_table[h-1,0:h]
+
+    def pack(self, x):
+        """
+        Returns the integer encoding the (possibly partial) configuration `x`
+        """
+        return sum(1 << self.index[i] for i, v in x.items() if v == 1)
+
+    def unpack(self, x):
+        """
+        Returns the configuration encoded by the integer `x`
+        """
+        return {i: x >> k & 1 for k, i in enumerate(self.names)}
+
+    def mask(self, I):
+        """
+        Returns the integer encoding the set of components `I`
+        """
+        return sum(1 << self.index[i] for i in I)
+
+    def components(self, mask):
+        """
+        Returns the set of components encoded by the integer `mask`
+        """
+        return {self.names[k] for k in bits(mask)}
+
+    def local_eval(self, k, x):
+        return self.compiled_f[k](x, x)
+
+    def min_configuration(self, x, k, H):
+        """
+        Returns `x` where the regulators of component `k` within the mask `H`
+        are set to their value minimizing `f[k]`
+        """
+        return (x & ~(self.pos_mask[k] & H)) | (self.neg_mask[k] & H)
+    def max_configuration(self, x, k, H):
+        """
+        Returns `x` where the regulators of component `k` within the mask `H`
+        are set to their value maximizing `f[k]`
+        """
+        return (x | (self.pos_mask[k] & H)) & ~(self.neg_mask[k] & H)
+
+
+def bits(mask):
+    """
+    Iterates over the indexes of the bits set in `mask`
+    """
+    while mask:
+        b = mask & -mask
+        yield b.bit_length() - 1
+        mask ^= b
+
+def can_flip(f, x, k, H, v):
     """
     return True iff there is a configuration z matching with x and H so that
-    f[i](z) is different from v
+    f[k](z) is different from v
     assumes f is locally monotone
     """
     v = bool(v)
     if v:
-        z = f.min_configuration(x, i, H)
+        z = f.min_configuration(x, k, H)
     else:
-        z = f.max_configuration(x, i, H)
-    return f.local_eval(i, z) != v
+        z = f.max_configuration(x, k, H)
+    return f.local_eval(k, z) != v
 
 def spread(f, x, I, d):
     """
     return subset of I that can flip within the given depth d
     """
-    H = set()
-    I = set(I) # work on a mutable copy
+    # can_flip is inlined: this is the innermost loop of simulations.
+    # Within the subcube spanned by H around x, hi (resp. lo) has every
+    # component of H at 1 (resp. 0): f[k] is maximized by reading its
+    # positive literals in hi and negative ones in lo, and minimized the
+    # other way around.
+    fs = f.compiled_f
+    H = 0
     for _ in range(d):
-        J = {i for i in I if can_flip(f, x, i, H, x[i])}
-        H.update(J)
-        I.difference_update(J)
+        hi, lo = x | H, x & ~H
+        J = 0
+        m = I
+        while m:
+            b = m & -m
+            m ^= b
+            k = b.bit_length() - 1
+            if x & b:
+                if not fs[k](lo, hi):
+                    J |= b
+            elif fs[k](hi, lo):
+                J |= b
+        H |= J
+        I &= ~J
         if not I or not J:
             break
     return H
@@ -95,130 +181,190 @@ def irreversible(f, x, H):
     """
     return subset of H that cannot flip back
     """
-    return {i for i in H if not can_flip(f, x, i, H, 1-x[i])}
+    # can_flip is inlined, see spread
+    fs = f.compiled_f
+    hi, lo = x | H, x & ~H
+    L = 0
+    m = H
+    while m:
+        b = m & -m
+        m ^= b
+        k = b.bit_length() - 1
+        if x & b:
+            if not fs[k](hi, lo):
+                L |= b
+        elif fs[k](lo, hi):
+            L |= b
+    return L
 
 def reachable_spaces(f, x, depth):
     """
-    a space is represented by a couple of sets of indices
+    a space is represented by a couple of masks of component indexes
         (H,L): H reversible flips, L irreversible flips
     """
     d = depth() if callable(depth) else depth
-    S = [] # list of (index set, index set)
-    I = frozenset(f) # set of indexes
+    S = [] # list of (index mask, index mask)
+    I = (1 << len(f)) - 1 # all indexes
     K = {I} # known
-    Q = [I] # queue
+    Q = deque([I]) # queue
     while Q:
-        I = Q.pop(0)
+        I = Q.popleft()
         H = spread(f, x, I, d) # H is subset of I
         if not H:
             continue
-        L = irreversible(f, x, H) if d > 1 else set() # L is subset of H
-        H.difference_update(L)
+        L = irreversible(f, x, H) if d > 1 else 0 # L is subset of H
+        H &= ~L
         S.append((H, L))
         # for each M non-empty subset of L
-        for M in chain.from_iterable(combinations(L, k) for k in range(1, len(L)+1)):
-            J = I.difference(M)
+        M = L
+        while M:
+            J = I & ~M
             if J not in K:
                 K.add(J)
                 Q.append(J)
+            M = (M - 1) & L
     return S
 
 class MPSimMemory(object):
-    def __init__(self, n, nb_spaces):
+    def __init__(self, n, nb_spaces=None, nb_randoms=1024):
+        if nb_spaces is not None:
+            warnings.warn("nb_spaces is ignored: MPSimMemory no longer "
+                "preallocates per-space buffers", DeprecationWarning,
+                stacklevel=2)
         self.n = n
-        self.nb_spaces = nb_spaces
-        self.m0 = np.zeros(nb_spaces*n)
-        self.make_views()
-    def ensure_spaces(self, nb_spaces):
-        if self.M0.shape[0] < nb_spaces:
-            self.nb_spaces = nb_spaces
-            self.m0.resize(nb_spaces*self.n, refcheck=False)
-            self.make_views()
-    def make_views(self):
-        self.M0 = self.m0.reshape(self.nb_spaces, self.n)
+        self.nb_randoms = nb_randoms
+        self.randoms = []
+        self.W = None
+        self.activities = {}
+    def random(self):
+        """
+        uniform float in [0, 1), drawn by batches from numpy global generator
+        """
+        if not self.randoms:
+            self.randoms = np.random.random(self.nb_randoms).tolist()
+        return self.randoms.pop()
+    def activity(self, f, W, h, l):
+        """
+        cumulated activities of the transitions of a space with h reversible
+        and l irreversible flips, by number of modified components (-1)
+        """
+        if W is not self.W:
+            self.W = W
+            self.activities = {}
+        cR = self.activities.get((h, l))
+        if cR is None:
+            # multiplicity of transitions
+            # R[k] is the multiplicity of a transition modifying k+1 components
+            R = np.zeros(self.n)
+            if l:
+                # all components of L have to change, multiplicity is 1
+                R[l-1] = 1
+            # multiplicity of H depends on cardinality of subsets
+            R[l:l+h] = f.binom_table[h,1:h+1]
+            R *= W # multiply by rate to obtain activity
+            cR = self.activities[(h, l)] = R.cumsum()
+        return cR
 
 def sample_configuration(f, mem, x, S, W):
     """
     sample one configuration reachable from x among the reachable spaces S
 
-    modifies x in-place
+    returns the sampled configuration
     """
-    n = len(f)
-    # compute apparent rate of transitions
-    mem.ensure_spaces(len(S))
-    R = mem.M0[:len(S),:]
-    R[:,:] = 0. # reset
-    # multiplicity of transitions
-    # R[i,k] is the multiplicity of a transition modifying k components
-    for i, (H, L) in enumerate(S):
-        if L:
-            # all components of L have to change, multiplicity is 1
-            R[i,len(L)-1] = 1
-        # multiplicity of H depends on cardinality of subsets
-        R[i,len(L):len(L)+len(H)] = binom(len(H), range(1, len(H)+1))
-    R *= W # multiply by rate to obtain activity
-    R.cumsum(out=mem.m0[:len(S)*n]) # in-place cumsum
+    # cumulated activities of each space, which only depend on the number
+    # of its reversible and irreversible flips
+    cRs = [mem.activity(f, W, H.bit_count(), L.bit_count()) for (H, L) in S]
+    totals = list(accumulate(float(cR[-1]) for cR in cRs))
     # pick transition
-    r = uniform(0, R[-1,-1]) # excludes R[-1,-1]
-    # select space s and nb of flips (-1)
-    s,m = next(zip(*np.where(R > r)))
-    m += 1
+    r = mem.random() * totals[-1] # excludes totals[-1]
+    # select space s: first cumulated activity above r
+    s = min(bisect_right(totals, r), len(S)-1)
+    if s:
+        r -= totals[s-1]
+    # select nb of flips (-1) within the space s
+    m = min(int(np.searchsorted(cRs[s], r, side="right")), len(f)-1) + 1
     # s = space, m = nb of components to flip
     H, C = S[s]
-    if H:
-        C.update(choice(list(H),m-len(C), replace=False))
-    for i in C:
-        x[i] = 1-x[i]
+    k = m - C.bit_count()
+    if k == H.bit_count():
+        C |= H
+    elif k:
+        # draw k components of H by partial Fisher-Yates shuffle
+        H = list(bits(H))
+        h = len(H)
+        for i in range(k):
+            j = i + int(mem.random() * (h-i))
+            H[i], H[j] = H[j], H[i]
+            C |= 1 << H[i]
+    return x ^ C
 
 def step(f, mem, x, depth, W):
+    """
+    returns a configuration sampled from the packed configuration x, or None
+    if x cannot change (x is not modified)
+    """
     S = reachable_spaces(f, x, depth)
     if not S:
-        return False
-    sample_configuration(f, mem, x, S, W)
-    return True
+        return None
+    return sample_configuration(f, mem, x, S, W)
 
 def is_subhypercube(a, b):
+    """
+    a and b are couples (x, H) of a configuration and a mask of free
+    components
+    """
     x, H = a
     y, G = b
-    return H.issubset(G) and \
-            not [i for i in set(x).difference(G) if x[i] != y[i]]
+    return not (H & ~G) and not ((x ^ y) & ~H & ~G)
+
+def _packed_attractors(f, A):
+    """
+    packs the attractors of `A`; attractors mentioning components which are
+    not in `f` (such as masked attractors of mutants) are unreachable and
+    skipped
+    """
+    return [(ia, (f.pack(x), f.mask(H))) for (ia, (x, H)) in A
+                if all(i in f.index for i in H) and all(i in f.index for i in x)]
+
+def filter_reachable_attractors(f, A, x):
+    """
+    returns the attractors of `A` (packed) which can still be reached from
+    the packed configuration `x`
+    """
+    n = len(f)
+    H = spread(f, x, (1 << n) - 1, n)
+    return [(ia,a) for (ia,a) in A if is_subhypercube(a, (x,H))]
 
 def sample_reachable_attractor(f, mem, x, A, depth, W, refresh_rate=10, emit=None):
     if not isinstance(f, MPBNSim): f = MPBNSim(f)
-    I = set(f)
-    n = len(f)
-    def filter_reachable_attractors(A, x):
-        H = spread(f, x, I, n)
-        return [(ia,a) for (ia,a) in A if is_subhypercube(a, (x,H))]
     k = 1
-    x = x.copy()
-    A = filter_reachable_attractors(A, x)
+    x = f.pack(x)
+    A = filter_reachable_attractors(f, _packed_attractors(f, A), x)
     while len(A) > 1:
         if emit is not None:
-            emit(x)
-        if not step(f, mem, x, depth, W):
+            emit(f.unpack(x))
+        y = step(f, mem, x, depth, W)
+        if y is None:
             k = 0
+        else:
+            x = y
         if k % refresh_rate == 0:
-            A = filter_reachable_attractors(A, x)
+            A = filter_reachable_attractors(f, A, x)
         k += 1
     return A[0][0]
 
 def sample_trace(f, mem, x, A, depth, W):
     if not isinstance(f, MPBNSim): f = MPBNSim(f)
-    I = set(f)
-    n = len(f)
-    def filter_reachable_attractors(A, x):
-        H = spread(f, x, I, n)
-        return [(ia,a) for (ia,a) in A if is_subhypercube(a, (x,H))]
-    k = 1
-    x = x.copy()
+    x = f.pack(x)
     trace = list()
-    trace.append(x.copy())
-    A = filter_reachable_attractors(A, x)
-    while len(A) and x != A[0][1][0]:
-        step(f, mem, x, depth, W)
-        trace.append(x.copy())
-        A = filter_reachable_attractors(A, x)
+    trace.append(f.unpack(x))
+    A = filter_reachable_attractors(f, _packed_attractors(f, A), x)
+    while len(A) and (A[0][1][1] or x != A[0][1][0]):
+        y = step(f, mem, x, depth, W)
+        if y is not None and y != x:
+            x = y
+            A = filter_reachable_attractors(f, A, x)
+        trace.append(f.unpack(x))
     return trace
 
 
@@ -226,22 +372,18 @@ def sample_switchpoint(f, mem, x, A, depth, W):
     """ experimental: sample a trace and stop at an attractor's
     strong bassin, returning the attractor as well."""
     if not isinstance(f, MPBNSim): f = MPBNSim(f)
-    I = set(f)
-    n = len(f)
-    def filter_reachable_attractors(A, x):
-        H = spread(f, x, I, n)
-        return [(ia,a) for (ia,a) in A if is_subhypercube(a, (x,H))]
     
     names = lambda _A: set(_a_name for _a_name, _a_cfg in _A)
-    k = 1
-    x = x.copy()
+    x = f.pack(x)
     trace = list()
-    A = filter_reachable_attractors(A, x)
-    trace.append((x.copy(), names(A)))
+    A = filter_reachable_attractors(f, _packed_attractors(f, A), x)
+    trace.append((f.unpack(x), names(A)))
     while len(A) > 1:
-        step(f, mem, x, depth, W)
-        A = filter_reachable_attractors(A, x)
-        trace.append((x.copy(), names(A)))
+        y = step(f, mem, x, depth, W)
+        if y is not None and y != x:
+            x = y
+            A = filter_reachable_attractors(f, A, x)
+        trace.append((f.unpack(x), names(A)))
     #return [*trace, [a_name for a_name, a_x in A]] 
     return trace
 
@@ -252,7 +394,7 @@ def convert_attractor(A):
 
 def estimate_reachable_attractors_probabilities(f, x, A, nb_sims, depth, W):
     f = MPBNSim(f)
-    mem = MPSimMemory(len(f), len(f))
+    mem = MPSimMemory(len(f))
     A = list(enumerate(map(convert_attractor, A)))
     C = {ia: 0 for (ia,_) in A}
     for _ in tqdm(range(nb_sims)):
@@ -263,8 +405,12 @@ def estimate_reachable_attractors_probabilities(f, x, A, nb_sims, depth, W):
     return C
 
 def parallel_estimate_reachable_attractors_probabilities(f, x, A, nb_sims, depth, W,
-            nb_jobs=0):
-
+            nb_jobs=0, progress_batch=100):
+    """
+    Parallel version of :py:func:`.estimate_reachable_attractors_probabilities`
+    using `nb_jobs` processes (0 for all available CPUs), which report their
+    progress every `progress_batch` simulations.
+    """
     if nb_jobs == 0:
         nb_jobs = cpu_count()
 
@@ -276,12 +422,18 @@ def parallel_estimate_reachable_attractors_probabilities(f, x, A, nb_sims, depth
 
     def worker(nb_sim):
         seed(int.from_bytes(os.urandom(4)))
-        mem = MPSimMemory(len(f), len(f))
+        mem = MPSimMemory(len(f))
         C = {ia: 0 for (ia,_) in A}
+        done = 0
         for _ in range(nb_sim):
             ia = sample_reachable_attractor(f, mem, x, A, depth, W)
             C[ia] += 1
-            q.put(ia)
+            done += 1
+            if done == progress_batch:
+                q.put(done)
+                done = 0
+        if done:
+            q.put(done)
         r.put(C)
 
     # create nb_jobs processes
@@ -292,8 +444,12 @@ def parallel_estimate_reachable_attractors_probabilities(f, x, A, nb_sims, depth
 
     for p in procs:
         p.start()
-    for _ in tqdm(range(nb_sims)):
-        q.get()
+    with tqdm(total=nb_sims) as progress:
+        remaining = nb_sims
+        while remaining:
+            done = q.get()
+            progress.update(done)
+            remaining -= done
     for p in procs:
         p.join()
 
@@ -326,24 +482,40 @@ def constant_unitary_depth(f):
     Returns 1
     """
     return 1
+def _random_depth(a, p, batch_size=1024):
+    """
+    Returns a function drawing a depth in `a` with probabilities `p`; draws
+    are made by batches of `batch_size` from numpy global generator
+    """
+    buf = []
+    pid = [os.getpid()]
+    def draw():
+        if pid[0] != os.getpid():
+            # forked process: do not replay the draws of its parent
+            pid[0] = os.getpid()
+            buf.clear()
+        if not buf:
+            buf.extend(np.random.choice(a, size=batch_size, p=p).tolist())
+        return buf.pop()
+    return draw
 def poly_depth(f, power=1.2):
     n = len(f)
     a = np.arange(1, n+1)
     p = np.arange(n, 0, -1, dtype="float64")**power
     p /= p.sum()
-    return lambda: np.random.choice(a, p=p)
+    return _random_depth(a, p)
 def reciprocal_depth(f):
     n = len(f)
     a = np.arange(1, n+1)
     p = 1/np.arange(1, n+1)
     p /= p.sum()
-    return lambda: np.random.choice(a, p=p)
+    return _random_depth(a, p)
 def nexponential_depth(f, base=2):
     n = len(f)
     a = np.arange(1, n+1)
     p = 1/ base**np.arange(0, n)
     p /= p.sum()
-    return lambda: np.random.choice(a, p=p)
+    return _random_depth(a, p)
 
 
 
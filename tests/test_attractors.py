@@ -7,3 +7,6 @@ class AttractorsTest(unittest.TestCase):
         mbn = mpbn.MPBooleanNetwork("examples/automata18.bnet")
         attractors = list(mbn.attractors())
         self.assertEqual(len(attractors), 2)
+    def test_has_cyclic_attractor(self):
+        self.assertFalse(mpbn.MPBooleanNetwork({"a": "!b", "b": "!a"}).has_cyclic_attractor())
+        self.assertTrue(mpbn.MPBooleanNetwork({"a": "!a", "b": "b"}).has_cyclic_attractor())
@@ -10,3 +10,42 @@ class InputTest(unittest.TestCase):
         self.assertRaises(AssertionError, oops)
         mbn = mpbn.MPBooleanNetwork()
         mbn["a"] = "(b&!c)|(!b&c)"
+
+    def test_asp_cache(self):
+        mbn = mpbn.MPBooleanNetwork({"a": "!b", "b": "a"})
+        asp = mbn.asp_of_bn()
+        self.assertEqual(mbn.asp_of_bn(), asp)
+        mbn["b"] = "!a"
+        self.assertNotEqual(mbn.asp_of_bn(), asp)
+        del mbn["b"]
+        self.assertNotIn('node("b")', mbn.asp_of_bn())
+
+    def test_dict_mutations(self):
+        mbn = mpbn.MPBooleanNetwork({"a": "!b", "b": "!a", "c": "c"})
+        self.assertEqual(len(list(mbn.attractors())), 4)
+        self.assertEqual(mbn.pop("c"), mbn.ba.parse("c"))
+        self.assertCountEqual(list(mbn.attractors()),
+                [{"a": 0, "b": 1}, {"a": 1, "b": 0}])
+        mbn.update({"b": "1"}, c="0")
+        self.assertEqual(list(mbn.attractors()), [{"a": 0, "b": 1, "c": 0}])
+        mbn.setdefault("d", "!c")
+        self.assertEqual(list(mbn.attractors()),
+                [{"a": 0, "b": 1, "c": 0, "d": 1}])
+        mbn.clear()
+        self.assertEqual(mbn.asp_of_bn(), "")
+
+    def test_dnf_clauses(self):
+        mbn = mpbn.MPBooleanNetwork(auto_dnf=False)
+        f = mbn.ba.parse("(c&b) | b | (b&c) | (!d&c)")
+        self.assertEqual(mpbn.dnf_clauses(f), [[("b", 1)], [("c", 1), ("d", -1)]])
+
+    def test_load(self):
+        mbn = mpbn.load("examples/automata18.bnet")
+        mbn2 = mpbn.load("examples/automata18.bnet")
+        self.assertIsNot(mbn, mbn2)
+        self.assertEqual(list(mbn.attractors()), list(mbn2.attractors()))
+        mbn["a"] = "(b&!c)|(!b&c)"
+        self.assertNotEqual(list(mbn.attractors()), list(mbn2.attractors()))
+        mbn3 = mpbn.load("examples/automata18.bnet")
+        self.assertEqual(str(mbn3["a"]), "!b")
+        self.assertEqual(list(mbn3.attractors()), list(mbn2.attractors()))
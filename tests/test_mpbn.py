@@ -0,0 +1,49 @@
+import unittest
+
+import mpbn
+
+class QueriesTest(unittest.TestCase):
+    def setUp(self):
+        self.mbn = mpbn.MPBooleanNetwork({
+            "a": "1",
+            "b": "a",
+            "c": "(!a & b) | c"})
+        self.toggle = mpbn.MPBooleanNetwork({
+            "a": "!b",
+            "b": "!a",
+            "c": "c"})
+
+    def test_constraints(self):
+        self.assertEqual(list(self.mbn.attractors(constraints={"c": 0})),
+                [{"a": 1, "b": 1, "c": 0}])
+        self.assertEqual(list(self.mbn.fixedpoints(constraints={"c": 1})),
+                [{"a": 1, "b": 1, "c": 1}])
+        self.assertEqual(list(self.mbn.attractors(constraints={"a": 0})), [])
+
+    def test_subcube(self):
+        self.assertEqual(list(self.toggle.maximal_trapspaces(subcube={"a": 1})),
+                [{"a": 1, "b": 0, "c": "*"}])
+
+    def test_reachable_from_total_partial(self):
+        x0 = {"a": 0, "b": 0, "c": 0}
+        both = [{"a": 1, "b": 1, "c": 0}, {"a": 1, "b": 1, "c": 1}]
+        self.assertCountEqual(list(self.mbn.attractors(reachable_from=x0)), both)
+        self.assertCountEqual(list(self.mbn.attractors(reachable_from={"a": 0})),
+                both)
+        self.assertEqual(list(self.mbn.attractors(reachable_from={"c": 1})),
+                [{"a": 1, "b": 1, "c": 1}])
+        fps = lambda x: {tuple(sorted(y.items()))
+                for y in self.mbn.fixedpoints(reachable_from=x)}
+        self.assertEqual(fps(x0), {tuple(sorted(y.items())) for y in both})
+        self.assertEqual(fps({"c": 1}), {(("a", 1), ("b", 1), ("c", 1))})
+
+    def test_counts(self):
+        mbn = self.mbn
+        self.assertEqual(mbn.count_attractors(), len(list(mbn.attractors())))
+        self.assertEqual(mbn.count_attractors(), 2)
+        self.assertEqual(mbn.count_attractors(reachable_from={"c": 1}), 1)
+        self.assertEqual(mbn.count_attractors(limit=1), 1)
+        self.assertEqual(mbn.count_fixedpoints(), 2)
+        self.assertEqual(mbn.count_fixedpoints(constraints={"c": 1}), 1)
+        self.assertEqual(mbn.count_fixedpoints(reachable_from={"a": 0}), 2)
+        self.assertEqual(self.toggle.count_attractors(), 4)
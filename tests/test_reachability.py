@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 
 import mpbn
@@ -15,3 +17,49 @@ class RechabilityTest_Automata18(unittest.TestCase):
         self.assertTrue(self.mbn.reachability(self.c0, self.ci))
     def test_cicd(self):
         self.assertFalse(self.mbn.reachability(self.ci, self.cd))
+    def test_repeated(self):
+        self.assertTrue(self.mbn.reachability(self.c0, self.c1))
+        self.assertFalse(self.mbn.reachability(self.ci, self.cd))
+        self.assertTrue(self.mbn.reachability(self.c0, self.c1))
+        self.mbn["a"] = "0"
+        self.assertFalse(self.mbn.reachability(self.c0, self.c1))
+    def test_reachable_from_nested(self):
+        succ = list(self.mbn.reachable_from(self.c0))
+        self.assertEqual(len(succ), 8)
+        for y in self.mbn.reachable_from(self.c0):
+            self.assertIn(len(list(self.mbn.reachable_from(y))), [1, 2, 8])
+        self.assertEqual(len(list(self.mbn.reachable_from(self.c0))), 8)
+    def test_dynamics(self):
+        dyn = mpbn.MostPermissiveDynamics(self.mbn)
+        for x in [self.c0, self.ci, self.cd]:
+            self.assertEqual(sorted(map(str, dyn(x))),
+                    sorted(map(str, self.mbn.reachable_from(x))))
+    def test_dynamics_modified_model(self):
+        mbn = mpbn.MPBooleanNetwork({"a": "a", "b": "a"})
+        dyn = mpbn.MostPermissiveDynamics(mbn)
+        self.assertEqual(len(dyn({"a": 0, "b": 0})), 1)
+        mbn["a"] = "1"
+        self.assertEqual(len(dyn({"a": 0, "b": 0})), 3)
+    def test_unknown_component(self):
+        mbn = mpbn.MPBooleanNetwork({"a": "1", "b": "a"})
+        x = {"a": 0, "b": 0, "zz": 1}
+        self.assertTrue(mbn.reachability(x, {"a": 1, "b": 1}))
+        self.assertEqual(len(list(mbn.reachable_from(x))), 3)
+        self.assertEqual(len(mpbn.MostPermissiveDynamics(mbn)(x)), 3)
+    def test_cache_dir(self):
+        with tempfile.TemporaryDirectory() as d:
+            self.assertTrue(self.mbn.reachability(self.c0, self.c1, cache_dir=d))
+            self.assertFalse(self.mbn.reachability(self.ci, self.cd, cache_dir=d))
+            mbn = mpbn.MPBooleanNetwork("examples/automata18.bnet")
+            self.assertTrue(mbn.reachability(self.c0, self.c1, cache_dir=d))
+            self.assertFalse(mbn.reachability(self.ci, self.cd, cache_dir=d))
+            self.assertEqual(len(os.listdir(d)), 2)
+        with tempfile.TemporaryDirectory() as d:
+            mbn = mpbn.MPBooleanNetwork("examples/automata18.bnet")
+            self.assertTrue(mbn.reachability(self.c0, self.c1, cache_dir=d))
+            entry, = os.listdir(d)
+            with open(os.path.join(d, entry), "w") as fp:
+                fp.write("0")
+            # the answer is read from the cache, not recomputed
+            mbn = mpbn.MPBooleanNetwork("examples/automata18.bnet")
+            self.assertFalse(mbn.reachability(self.c0, self.c1, cache_dir=d))
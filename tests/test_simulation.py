@@ -0,0 +1,60 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import mpbn
+import mpbn.simulation as mpbn_sim
+import mpbn.cli.sim
+
+class SimulationTest(unittest.TestCase):
+    def setUp(self):
+        self.f = mpbn_sim.MPBNSim({
+            "a": "1",
+            "b": "a",
+            "c": "(!a & b)|c"})
+        self.x0 = self.f.zero()
+
+    def test_reachable_spaces(self):
+        f = self.f
+        S = mpbn_sim.reachable_spaces(f, f.pack(self.x0), len(f))
+        S = [(f.components(H), f.components(L)) for (H, L) in S]
+        self.assertEqual(S, [({"b", "c"}, {"a"})])
+        S = mpbn_sim.reachable_spaces(f, f.pack(self.x0), 1)
+        S = [(f.components(H), f.components(L)) for (H, L) in S]
+        self.assertEqual(S, [({"a"}, set())])
+
+    def test_estimate(self):
+        A = list(self.f.attractors(reachable_from=self.x0))
+        self.assertEqual(len(A), 2)
+        np.random.seed(0)
+        C = mpbn_sim.estimate_reachable_attractors_probabilities(self.f,
+                self.x0, A, 100,
+                mpbn_sim.constant_maximum_depth(self.f),
+                mpbn_sim.uniform_rates(self.f))
+        self.assertEqual(set(C), {0, 1})
+        self.assertAlmostEqual(sum(C.values()), 100)
+        self.assertTrue(all(p > 0 for p in C.values()))
+
+    def test_bladder_mutant(self):
+        with open("examples/simulation_bladder.json") as fp:
+            setup = json.load(fp)
+        setup["nb_sims"] = 20
+        setup["experiments"] = setup["experiments"][:1]
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "setup.json")
+            with open(path, "w") as fp:
+                json.dump(setup, fp)
+            out = io.StringIO()
+            np.random.seed(0)
+            with mock.patch.object(sys, "argv", ["mpbn-sim", path]), \
+                    contextlib.redirect_stdout(out), \
+                    contextlib.redirect_stderr(io.StringIO()):
+                mpbn.cli.sim.main()
+        self.assertIn("### PI3K E1", out.getvalue())